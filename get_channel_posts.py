@@ -5,7 +5,7 @@ import asyncio
 import csv
 import json
 import datetime as dt
-from typing import Any, Dict
+from typing import Any, Callable, Dict
 
 from dotenv import load_dotenv
 from telethon import TelegramClient, errors
@@ -52,6 +52,10 @@ def dt_to_iso(d: dt.datetime | None) -> str | None:
     return d.isoformat()
 
 
+# class -> its to_dict function (None if it has none), filled on first use
+TO_DICT: Dict[type, Callable[[Any], dict] | None] = {}
+
+
 def obj_to_dict_safe(obj: Any) -> Any:
     """
     Convert TL objects and nested structures to JSON-serializable structures.
@@ -74,16 +78,42 @@ def obj_to_dict_safe(obj: Any) -> Any:
     if isinstance(obj, (list, tuple, set)):
         return [obj_to_dict_safe(x) for x in obj]
 
-    if hasattr(obj, "to_dict"):
-        try:
-            raw = obj.to_dict()
-        except Exception:
-            return repr(obj)
-        return obj_to_dict_safe(raw)
+    cls = type(obj)
+    try:
+        to_dict = TO_DICT[cls]
+    except KeyError:
+        to_dict = TO_DICT[cls] = getattr(cls, "to_dict", None)
+    if to_dict is not None:
+        return obj_to_dict_safe(to_dict(obj))
 
     return repr(obj)
 
 
+# Column order of the CSV, same as the keys of message_to_record()
+FIELDNAMES: tuple[str, ...] = (
+    # basic fields
+    "id", "peer_id", "date", "date_ts", "edit_date", "post", "legacy",
+    "ttl_period",
+    # text
+    "message", "raw_text",
+    # author / source
+    "from_id", "sender_id", "sender", "post_author", "via_bot_id",
+    "via_business_bot_id", "fwd_from",
+    # content and formatting
+    "entities", "media", "reply_markup", "grouped_id",
+    # media helpers
+    "reply_to_msg_id", "photo", "document", "video", "audio", "voice", "gif",
+    "sticker", "poll", "web_preview", "file",
+    # metrics and replies
+    "views", "forwards", "replies", "reactions",
+    # behavior flags
+    "pinned", "silent", "noforwards", "from_scheduled", "edit_hide", "out",
+    "mentioned", "media_unread", "restriction_reason",
+    # service / action
+    "action",
+)
+
+
 def message_to_record(msg: Message) -> Dict[str, Any]:
     """
     Extract as many metadata fields as possible for a single channel post.
@@ -181,7 +211,12 @@ async def fetch_channel_history() -> None:
     print(f"[+] Output: {output_path}")
 
     csv_file = open(output_path, "w", encoding="utf-8", newline="")
-    writer = None
+    writer = csv.DictWriter(
+        csv_file,
+        fieldnames=FIELDNAMES,
+        quoting=csv.QUOTE_MINIMAL,
+    )
+    writer.writeheader()
     total = 0
     offset_id = 0
 
@@ -225,16 +260,6 @@ async def fetch_channel_history() -> None:
 
                 rec = message_to_record(msg)
 
-                # init writer + header on first real record
-                if writer is None:
-                    fieldnames = list(rec.keys())
-                    writer = csv.DictWriter(
-                        csv_file,
-                        fieldnames=fieldnames,
-                        quoting=csv.QUOTE_MINIMAL,
-                    )
-                    writer.writeheader()
-
                 # prepare row: JSON for complex, escape newlines in strings
                 row: Dict[str, Any] = {}
                 for k, v in rec.items():
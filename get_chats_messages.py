@@ -2,19 +2,27 @@
 
 import os
 import asyncio
+import contextlib
 import csv
-import json
+import gzip
+import io
 import datetime as dt
-from typing import Any, Dict
+from typing import IO, Any, Callable, Dict
 
+import orjson
 from dotenv import load_dotenv
 from telethon import TelegramClient, errors
-from telethon.tl.functions.messages import SearchRequest
 from telethon.tl.types import (
-    InputMessagesFilterEmpty,
+    Chat,
     Message,
+    User,
 )
 
+try:
+    import uvloop  # optional: faster event loop (Linux/macOS)
+except ImportError:
+    uvloop = None
+
 # ------------- CONFIG (EDIT THIS BLOCK) -------------
 
 # Numeric peer id only, e.g. user, group or supergroup:
@@ -28,7 +36,11 @@ FROM_DATE_STR = "2025-11-01"
 TO_DATE_STR = "2025-11-02"
 
 OUTPUT_DIR = "chats"
-BATCH_LIMIT = 100  # page size for SearchRequest
+OUTPUT_FORMAT = "csv"  # "csv" or "jsonl" (one JSON object per message)
+PAGE_SIZE = 100  # messages per page handed to the writer
+PREFETCH_PAGES = 2  # pages fetched ahead of the writer
+WRITE_BUFFER_SIZE = 1 << 20  # output file buffer, bytes
+COMPRESS_OUTPUT = False  # write a gzip-compressed <output>.gz instead
 
 # ----------------------------------------------------
 
@@ -41,120 +53,382 @@ SESSION_NAME = os.getenv("TG_SESSION", "telegram_session")
 if not API_ID or not API_HASH:
     raise RuntimeError("Please set TG_API_ID and TG_API_HASH in .env")
 
-FROM_DT = dt.datetime.fromisoformat(FROM_DATE_STR)
-TO_DT = dt.datetime.fromisoformat(TO_DATE_STR)
+if OUTPUT_FORMAT not in ("csv", "jsonl"):
+    raise RuntimeError(f"Unknown OUTPUT_FORMAT: {OUTPUT_FORMAT!r}")
+
+# local time, made tz-aware to compare with message dates
+FROM_DT = dt.datetime.fromisoformat(FROM_DATE_STR).astimezone()
+TO_DT = dt.datetime.fromisoformat(TO_DATE_STR).astimezone()
 FROM_TS = int(FROM_DT.timestamp())
 TO_TS = int(TO_DT.timestamp())
 
 
-def dt_to_iso(d: dt.datetime | None) -> str | None:
-    if d is None:
-        return None
-    return d.isoformat()
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+JSONL_OPTIONS = JSON_OPTIONS | orjson.OPT_APPEND_NEWLINE
+
+
+# Column spec: (column, message attribute, kind). Kinds:
+#   raw  - attribute value as is
+#   text - string with escaped line breaks
+#   json - TL object / nested structure serialized to JSON
+#   shared - like json, for objects shared by the messages of a page
+#            (resolved entities); serialized once per page
+#   iso  - datetime as ISO string
+#   ts   - datetime as unix timestamp
+COLUMNS: tuple[tuple[str, str, str], ...] = (
+    # basic fields
+    ("id", "id", "raw"),
+    ("peer_id", "peer_id", "json"),
+    ("date", "date", "iso"),
+    ("date_ts", "date", "ts"),
+    ("edit_date", "edit_date", "iso"),
+    ("post", "post", "raw"),
+    ("legacy", "legacy", "raw"),
+    ("ttl_period", "ttl_period", "raw"),
+
+    # text
+    ("message", "message", "text"),
+    ("raw_text", "raw_text", "text"),
+
+    # author / source
+    ("from_id", "from_id", "json"),
+    ("sender_id", "sender_id", "raw"),
+    ("sender", "sender", "shared"),
+    ("post_author", "post_author", "text"),
+    ("via_bot_id", "via_bot_id", "raw"),
+    ("via_business_bot_id", "via_business_bot_id", "raw"),
+    ("fwd_from", "fwd_from", "json"),
+
+    # content and formatting
+    ("entities", "entities", "json"),
+    ("media", "media", "json"),
+    ("reply_markup", "reply_markup", "json"),
+    ("grouped_id", "grouped_id", "raw"),
+
+    # media helpers
+    ("reply_to_msg_id", "reply_to_msg_id", "raw"),
+    ("photo", "photo", "json"),
+    ("document", "document", "json"),
+    ("video", "video", "json"),
+    ("audio", "audio", "json"),
+    ("voice", "voice", "json"),
+    ("gif", "gif", "json"),
+    ("sticker", "sticker", "json"),
+    ("poll", "poll", "json"),
+    ("web_preview", "web_preview", "json"),
+    ("file", "file", "json"),
+
+    # metrics and replies (views/forwards usually None in chats)
+    ("views", "views", "raw"),
+    ("forwards", "forwards", "raw"),
+    ("replies", "replies", "json"),
+    ("reactions", "reactions", "json"),
+
+    # behavior flags
+    ("pinned", "pinned", "raw"),
+    ("silent", "silent", "raw"),
+    ("noforwards", "noforwards", "raw"),
+    ("from_scheduled", "from_scheduled", "raw"),
+    ("edit_hide", "edit_hide", "raw"),
+    ("out", "out", "raw"),
+    ("mentioned", "mentioned", "raw"),
+    ("media_unread", "media_unread", "raw"),
+    ("restriction_reason", "restriction_reason", "json"),
+
+    # service / action
+    ("action", "action", "json"),
+)
+
+# Attributes that depend on the Telethon layer / message type
+OPTIONAL_ATTRS = {"via_business_bot_id", "action"}
+
+FIELDNAMES: tuple[str, ...] = tuple(name for name, _, _ in COLUMNS)
+CSV_HEADER = (",".join(FIELDNAMES) + "\r\n").encode()
+
+# Columns whose value is fixed for regular messages of a given peer kind
+# (channel post flags, business bots outside private chats, service actions).
+# views/forwards/replies are never folded: forwarded channel posts keep them.
+CONSTANT_COLUMNS: Dict[str, Dict[str, Any]] = {
+    "user": {
+        "post": False,
+        "post_author": None,
+        "action": None,
+    },
+    "chat": {
+        "post": False,
+        "post_author": None,
+        "via_business_bot_id": None,
+        "action": None,
+    },
+    "megagroup": {
+        "post": False,
+        "via_business_bot_id": None,
+        "action": None,
+    },
+    "channel": {
+        "action": None,
+    },
+}
+
+
+# class -> its to_dict function (None if it has none), filled on first use
+TO_DICT: Dict[type, Callable[[Any], dict] | None] = {}
+
+
+def json_default(obj: Any) -> Any:
+    """
+    Fallback for objects orjson can't serialize natively (TL objects, bytes).
+    """
+    cls = type(obj)
+    try:
+        to_dict = TO_DICT[cls]
+    except KeyError:
+        to_dict = TO_DICT[cls] = getattr(cls, "to_dict", None)
+    if to_dict is not None:
+        return to_dict(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.hex()
+    return repr(obj)
 
 
-def obj_to_dict_safe(obj: Any) -> Any:
+def build_extractor(
+    columns: tuple,
+    constants: Dict[str, Any] | None = None,
+    as_record: bool = False,
+) -> Callable[[Message, dict | None], Any]:
     """
-    Convert TL objects and nested structures to JSON-serializable structures.
+    Generate extract_row(msg, cache) for the given column spec: plain
+    attribute loads with per-kind conversions inlined, returning the CSV
+    row in column order. Columns listed in constants are emitted as
+    literals; "shared" cells are memoized in cache by object id.
+
+    With as_record=True the function returns a {column: value} dict for
+    JSONL instead: values stay native (datetimes, TL objects) and are
+    encoded by a single orjson.dumps call over the whole record. Records
+    memoize nothing, so their cache argument may be None.
     """
-    if obj is None:
-        return None
+    constants = constants or {}
+    lines = ["def extract_row(msg, cache):"]
+    items = []
+    local_names: Dict[str, str] = {}
+
+    for name, attr, kind in columns:
+        if name in constants:
+            items.append(repr(constants[name]))
+            continue
+
+        if attr in OPTIONAL_ATTRS:
+            load = f"getattr(msg, {attr!r}, None)"
+        else:
+            load = f"msg.{attr}"
+
+        # records keep native values; only date_ts is derived
+        if kind == "raw" or (as_record and kind != "ts"):
+            items.append(load)
+            continue
+
+        # each attribute is loaded once, e.g. date feeds both date and date_ts
+        v = local_names.get(attr)
+        if v is None:
+            v = local_names[attr] = f"v{len(local_names)}"
+            lines.append(f"    {v} = {load}")
+        if kind == "text":
+            # str.replace over str.translate: each replace is a fast scan that
+            # returns the string itself when there is nothing to escape, while
+            # translate() with multi-char targets walks the text char by char
+            expr = f"{v}.replace('\\r', '\\\\r').replace('\\n', '\\\\n') if {v} else {v}"
+        elif kind == "json":
+            expr = (
+                f"None if {v} is None else "
+                f"dumps({v}, default=json_default, option=JSON_OPTIONS).decode()"
+            )
+        elif kind == "shared":
+            # cache holds (obj, cell): keeping obj alive pins its id()
+            c = f"c{len(local_names)}"
+            lines += [
+                f"    if {v} is None:",
+                f"        {c} = None",
+                "    else:",
+                f"        hit = cache.get(id({v}))",
+                "        if hit is None:",
+                f"            hit = cache[id({v})] = ({v}, dumps(",
+                f"                {v}, default=json_default, option=JSON_OPTIONS",
+                "            ).decode())",
+                f"        {c} = hit[1]",
+            ]
+            expr = c
+        elif kind == "iso":
+            expr = f"{v}.isoformat() if {v} else None"
+        elif kind == "ts":
+            expr = f"int({v}.timestamp()) if {v} else None"
+        else:
+            raise ValueError(f"Unknown column kind: {kind}")
+        items.append(f"({expr})")
 
-    if isinstance(obj, (str, int, float, bool)):
-        return obj
+    if as_record:
+        lines.append("    return {")
+        lines.extend(
+            f"        {name!r}: {item}," for (name, _, _), item in zip(columns, items)
+        )
+        lines.append("    }")
+    else:
+        lines.append("    return [")
+        lines.extend(f"        {item}," for item in items)
+        lines.append("    ]")
+
+    # encoder and its settings are bound once as globals of the generated code
+    namespace: Dict[str, Any] = {
+        "dumps": orjson.dumps,
+        "json_default": json_default,
+        "JSON_OPTIONS": JSON_OPTIONS,
+    }
+    exec("\n".join(lines), namespace)
+    return namespace["extract_row"]
 
-    if isinstance(obj, (bytes, bytearray)):
-        return obj.hex()
 
-    if isinstance(obj, dt.datetime):
-        return obj.isoformat()
+EXTRACTORS = {
+    kind: build_extractor(COLUMNS, constants, as_record=OUTPUT_FORMAT == "jsonl")
+    for kind, constants in CONSTANT_COLUMNS.items()
+}
 
-    if isinstance(obj, dict):
-        return {k: obj_to_dict_safe(v) for k, v in obj.items()}
 
-    if isinstance(obj, (list, tuple, set)):
-        return [obj_to_dict_safe(x) for x in obj]
+def peer_kind(entity: Any) -> str:
+    """
+    Map a resolved entity to a CONSTANT_COLUMNS key.
+    """
+    if isinstance(entity, User):
+        return "user"
+    if isinstance(entity, Chat):
+        return "chat"
+    if getattr(entity, "megagroup", False):
+        return "megagroup"
+    return "channel"
+
+
+def serialize_page(
+    messages: list, extract_row: Callable[[Message, dict], list]
+) -> tuple[bytes, int]:
+    """
+    Format the messages of one page as a UTF-8 encoded CSV chunk.
+    Returns the chunk and the number of rows in it.
+    """
+    # messages of a page share sender entities: serialize each one once
+    cache: Dict[int, tuple] = {}
+    rows = [
+        extract_row(msg, cache)
+        for msg in messages
+        # skips MessageService / MessageEmpty; the date window is already
+        # applied while fetching
+        if type(msg) is Message and msg.date is not None
+    ]
+
+    # writerows() assembles the whole page inside the C csv module
+    buf = io.StringIO(newline="")
+    csv.writer(buf, quoting=csv.QUOTE_MINIMAL).writerows(rows)
+    return buf.getvalue().encode(), len(rows)
+
+
+def serialize_page_jsonl(
+    messages: list, extract_record: Callable[[Message, dict | None], dict]
+) -> tuple[bytes, int]:
+    """
+    Format the messages of one page as a JSONL chunk.
+    Returns the chunk and the number of records in it.
+    """
+    lines = [
+        orjson.dumps(
+            extract_record(msg, None), default=json_default, option=JSONL_OPTIONS
+        )
+        for msg in messages
+        if type(msg) is Message and msg.date is not None
+    ]
+    return b"".join(lines), len(lines)
 
-    if hasattr(obj, "to_dict"):
-        try:
-            raw = obj.to_dict()
-        except Exception:
-            return repr(obj)
-        return obj_to_dict_safe(raw)
 
-    return repr(obj)
+def load_resume_id(state_path: str) -> int:
+    """
+    Return the message id an interrupted export of the same window and
+    format stopped at, or 0 to start from the top of the window.
+    """
+    try:
+        with open(state_path, "rb") as f:
+            state = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return 0
+
+    if state.get("window") != [FROM_DATE_STR, TO_DATE_STR]:
+        return 0
+    if state.get("format") != OUTPUT_FORMAT:
+        return 0
+    return int(state.get("min_id") or 0)
 
 
-def message_to_record(msg: Message) -> Dict[str, Any]:
+def save_resume_id(state_path: str, min_id: int) -> None:
     """
-    Extract as many metadata fields as possible for a single chat message.
+    Remember the oldest message id written so far, for the next run.
     """
-    rec: Dict[str, Any] = {
-        # basic fields
-        "id": msg.id,
-        "peer_id": obj_to_dict_safe(getattr(msg, "peer_id", None)),
-        "date": dt_to_iso(getattr(msg, "date", None)),
-        "date_ts": int(msg.date.timestamp()) if msg.date else None,
-        "edit_date": dt_to_iso(getattr(msg, "edit_date", None)),
-        "post": getattr(msg, "post", None),
-        "legacy": getattr(msg, "legacy", None),
-        "ttl_period": getattr(msg, "ttl_period", None),
-
-        # text
-        "message": getattr(msg, "message", None),
-        "raw_text": getattr(msg, "raw_text", None),
-
-        # author / source
-        "from_id": obj_to_dict_safe(getattr(msg, "from_id", None)),
-        "sender_id": getattr(msg, "sender_id", None),
-        "sender": obj_to_dict_safe(getattr(msg, "sender", None)),
-        "post_author": getattr(msg, "post_author", None),
-        "via_bot_id": getattr(msg, "via_bot_id", None),
-        "via_business_bot_id": getattr(msg, "via_business_bot_id", None),
-        "fwd_from": obj_to_dict_safe(getattr(msg, "fwd_from", None)),
-
-        # content and formatting
-        "entities": obj_to_dict_safe(getattr(msg, "entities", None)),
-        "media": obj_to_dict_safe(getattr(msg, "media", None)),
-        "reply_markup": obj_to_dict_safe(getattr(msg, "reply_markup", None)),
-        "grouped_id": getattr(msg, "grouped_id", None),
-
-        # media helpers
-        "reply_to_msg_id": getattr(msg, "reply_to_msg_id", None),
-        "photo": obj_to_dict_safe(getattr(msg, "photo", None)),
-        "document": obj_to_dict_safe(getattr(msg, "document", None)),
-        "video": obj_to_dict_safe(getattr(msg, "video", None)),
-        "audio": obj_to_dict_safe(getattr(msg, "audio", None)),
-        "voice": obj_to_dict_safe(getattr(msg, "voice", None)),
-        "gif": obj_to_dict_safe(getattr(msg, "gif", None)),
-        "sticker": obj_to_dict_safe(getattr(msg, "sticker", None)),
-        "poll": obj_to_dict_safe(getattr(msg, "poll", None)),
-        "web_preview": obj_to_dict_safe(getattr(msg, "web_preview", None)),
-        "file": obj_to_dict_safe(getattr(msg, "file", None)),
-
-        # metrics and replies (views/forwards usually None in chats)
-        "views": getattr(msg, "views", None),
-        "forwards": getattr(msg, "forwards", None),
-        "replies": obj_to_dict_safe(getattr(msg, "replies", None)),
-        "reactions": obj_to_dict_safe(getattr(msg, "reactions", None)),
-
-        # behavior flags
-        "pinned": getattr(msg, "pinned", False),
-        "silent": getattr(msg, "silent", False),
-        "noforwards": getattr(msg, "noforwards", False),
-        "from_scheduled": getattr(msg, "from_scheduled", False),
-        "edit_hide": getattr(msg, "edit_hide", False),
-        "out": getattr(msg, "out", None),
-        "mentioned": getattr(msg, "mentioned", None),
-        "media_unread": getattr(msg, "media_unread", None),
-        "restriction_reason": obj_to_dict_safe(
-            getattr(msg, "restriction_reason", None)
-        ),
-
-        # service / action
-        "action": obj_to_dict_safe(getattr(msg, "action", None)),
+    state = {
+        "window": [FROM_DATE_STR, TO_DATE_STR],
+        "format": OUTPUT_FORMAT,
+        "min_id": min_id,
     }
-    return rec
+    with open(state_path, "wb") as f:
+        f.write(orjson.dumps(state))
+
+
+def open_output(path: str, mode: str) -> IO[bytes]:
+    """
+    Open the binary output file, gzip-compressed when COMPRESS_OUTPUT is set.
+    """
+    if COMPRESS_OUTPUT:
+        # level 1: several times smaller for text-heavy exports at little CPU
+        return gzip.open(path, mode, compresslevel=1)
+    return open(path, mode, buffering=WRITE_BUFFER_SIZE)
+
+
+async def fetch_pages(
+    client: TelegramClient, entity: Any, pages: asyncio.Queue, max_id: int
+) -> bool:
+    """
+    Iterate the history back in time from TO_DT down to FROM_DT (below
+    max_id when resuming) and queue it in pages of PAGE_SIZE messages.
+    None is queued last, unless the task is cancelled. Returns False if
+    stopped by FloodWait.
+    """
+    page: list = []
+    complete = True
+
+    try:
+        try:
+            # Telethon fetches the largest chunks the API allows; with no
+            # limit it would also sleep 1s between them unless wait_time=0
+            async for msg in client.iter_messages(
+                entity,
+                limit=None,
+                offset_date=TO_DT,
+                max_id=max_id,
+                wait_time=0,
+            ):
+                if msg.date is not None and msg.date < FROM_DT:
+                    break
+                page.append(msg)
+                if len(page) == PAGE_SIZE:
+                    await pages.put(page)
+                    page = []
+        except errors.FloodWaitError as e:
+            print(f"[!] FloodWait: need to wait {e.seconds} seconds and rerun to resume.")
+            complete = False
+
+        if page:
+            await pages.put(page)
+    except Exception:
+        # wake the writer; the error surfaces when the task is awaited
+        await pages.put(None)
+        raise
+
+    # not in a finally: once cancelled, nobody drains the queue any more
+    await pages.put(None)
+    return complete
 
 
 async def fetch_chat_history() -> None:
@@ -169,104 +443,88 @@ async def fetch_chat_history() -> None:
     entity = await client.get_entity(CHAT_PEER_ID)
     # entity can be User, Chat, or Channel (megagroup); all are fine here
 
-    peer = entity  # for SearchRequest we can pass the entity directly
     peer_id_str = str(CHAT_PEER_ID)
     title = getattr(entity, "title", None) or getattr(entity, "username", None) or peer_id_str
+    kind = peer_kind(entity)
+    extract_row = EXTRACTORS[kind]
+    if OUTPUT_FORMAT == "jsonl":
+        serialize = serialize_page_jsonl
+    else:
+        serialize = serialize_page
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    output_path = os.path.join(OUTPUT_DIR, f"{peer_id_str}_chat_messages.csv")
+    output_path = os.path.join(OUTPUT_DIR, f"{peer_id_str}_chat_messages.{OUTPUT_FORMAT}")
+    if COMPRESS_OUTPUT:
+        output_path += ".gz"
 
-    print(f"[+] Chat: {title} (peer id={peer_id_str})")
+    print(f"[+] Chat: {title} (peer id={peer_id_str}, {kind})")
     print(f"[+] Range (ts): {FROM_TS} .. {TO_TS}")
     print(f"[+] Output: {output_path}")
 
-    csv_file = open(output_path, "w", encoding="utf-8", newline="")
-    writer = None
+    # an interrupted run leaves its stop point next to the output
+    state_path = f"{output_path}.state.json"
+    resume_id = load_resume_id(state_path) if os.path.exists(output_path) else 0
+    if resume_id:
+        print(f"[+] Resuming below message id {resume_id}")
+
+    # chunks arrive encoded, so the file is written as raw bytes
+    mode = "ab" if resume_id else "wb"
+    out_file = open_output(output_path, mode)
+    if OUTPUT_FORMAT == "csv" and not resume_id:
+        out_file.write(CSV_HEADER)
     total = 0
-    offset_id = 0
+    min_id = resume_id
+    complete = False
+
+    # the next page is fetched while the current one is being formatted
+    pages: asyncio.Queue = asyncio.Queue(maxsize=PREFETCH_PAGES)
+    producer = asyncio.create_task(fetch_pages(client, entity, pages, resume_id))
 
     try:
         while True:
-            try:
-                result = await client(
-                    SearchRequest(
-                        peer=peer,
-                        q="",  # no keyword filter
-                        filter=InputMessagesFilterEmpty(),
-                        min_id=0,
-                        max_id=0,
-                        offset_id=offset_id,
-                        add_offset=0,
-                        limit=BATCH_LIMIT,
-                        min_date=FROM_TS,
-                        max_date=TO_TS,
-                        hash=0,
-                    )
-                )
-            except errors.FloodWaitError as e:
-                print(f"[!] FloodWait: need to wait {e.seconds} seconds and rerun.")
-                break
-
-            messages = result.messages or []
-            if not messages:
+            messages = await pages.get()
+            if messages is None:
                 break
 
-            min_id_in_batch = None
-
-            for msg in messages:
-                if not isinstance(msg, Message):
-                    continue
-                if not msg.date:
-                    continue
-
-                msg_ts = int(msg.date.timestamp())
-                if msg_ts < FROM_TS or msg_ts >= TO_TS:
-                    continue
-
-                rec = message_to_record(msg)
-
-                if writer is None:
-                    fieldnames = list(rec.keys())
-                    writer = csv.DictWriter(
-                        csv_file,
-                        fieldnames=fieldnames,
-                        quoting=csv.QUOTE_MINIMAL,
-                    )
-                    writer.writeheader()
-
-                row: Dict[str, Any] = {}
-                for k, v in rec.items():
-                    if isinstance(v, (dict, list)):
-                        row[k] = json.dumps(v, ensure_ascii=False)
-                    elif isinstance(v, str):
-                        # escape line breaks to keep one physical line per CSV row
-                        row[k] = v.replace("\r", "\\r").replace("\n", "\\n")
-                    else:
-                        row[k] = v
-
-                writer.writerow(row)
-                total += 1
-
-                if min_id_in_batch is None or msg.id < min_id_in_batch:
-                    min_id_in_batch = msg.id
+            # format off the event loop so network traffic keeps flowing
+            chunk, count = await asyncio.to_thread(serialize, messages, extract_row)
+            out_file.write(chunk)
+            total += count
+            min_id = min(m.id for m in messages)
 
             if total and total % 500 == 0:
                 print(f"[+] Collected: {total}")
 
-            if min_id_in_batch is None:
-                break
-
-            offset_id = min_id_in_batch  # paginate backwards
+        complete = await producer
 
-        if total == 0:
+        if not complete:
+            print(f"[!] Stopped early. Saved {total} messages.")
+        elif resume_id and total == 0:
+            print(f"[=] Resumed, no further messages below id {resume_id}.")
+        elif resume_id:
+            print(f"[✓] Done. Resumed and saved {total} more messages.")
+        elif total == 0:
             print("[=] No messages in the given interval.")
         else:
             print(f"[✓] Done. Saved {total} messages.")
 
     finally:
-        csv_file.close()
+        # let the producer unwind before the client goes away
+        producer.cancel()
+        # its own errors were already raised by the await in the try block
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await producer
+        out_file.close()
+        if complete:
+            if os.path.exists(state_path):
+                os.remove(state_path)
+        elif min_id:
+            save_resume_id(state_path, min_id)
         await client.disconnect()
 
 
 if __name__ == "__main__":
-    asyncio.run(fetch_chat_history())
+    if uvloop is not None:
+        uvloop.run(fetch_chat_history())
+    else:
+        asyncio.run(fetch_chat_history())
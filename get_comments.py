@@ -1,20 +1,30 @@
 import os
 import asyncio
 import csv
-import json
-import datetime as dt
-from typing import Any, Dict
+import gzip
+import io
+from typing import IO, Any, Callable, Dict
 
+import orjson
 from dotenv import load_dotenv
 from telethon import TelegramClient, errors
 from telethon.tl.types import Message, Channel
 
+try:
+    import uvloop  # optional: faster event loop (Linux/macOS)
+except ImportError:
+    uvloop = None
+
 # -------- CONFIG (ONLY NUMERIC PEER ID + MESSAGE ID) --------
 
 CHANNEL_PEER_ID = -1001271343429   # channel peer id
 MESSAGE_ID = 158404                # post id in this channel
 
 OUTPUT_DIR = "comments"
+OUTPUT_FORMAT = "csv"  # "csv" or "jsonl" (one JSON object per comment)
+WRITE_BATCH = 256  # rows formatted in memory before each file write
+WRITE_BUFFER_SIZE = 1 << 20  # output file buffer, bytes
+COMPRESS_OUTPUT = False  # write a gzip-compressed <output>.gz instead
 
 # ------------------------------------------------------------
 
@@ -24,69 +34,173 @@ API_ID = int(os.getenv("TG_API_ID", "0"))
 API_HASH = os.getenv("TG_API_HASH")
 SESSION_NAME = os.getenv("TG_SESSION", "telegram_session")
 
+if OUTPUT_FORMAT not in ("csv", "jsonl"):
+    raise RuntimeError(f"Unknown OUTPUT_FORMAT: {OUTPUT_FORMAT!r}")
 
-def dt_to_iso(d: dt.datetime | None) -> str | None:
-    return d.isoformat() if d else None
 
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+JSONL_OPTIONS = JSON_OPTIONS | orjson.OPT_APPEND_NEWLINE
 
-def obj_to_dict_safe(obj: Any) -> Any:
-    """
-    Convert Telethon objects to JSON-safe structures.
-    """
-    if obj is None:
-        return None
 
-    if isinstance(obj, (str, int, float, bool)):
-        return obj
+# Column spec: (column, message attribute, kind). Kinds:
+#   raw    - attribute value as is
+#   text   - string with escaped line breaks
+#   json   - Telethon object serialized to JSON
+#   shared - like json, for entities shared between comments; serialized
+#            once per batch
+#   iso    - datetime as ISO string
+#   ts     - datetime as unix timestamp
+COLUMNS: tuple[tuple[str, str, str], ...] = (
+    # basic
+    ("id", "id", "raw"),
+    ("date", "date", "iso"),
+    ("date_ts", "date", "ts"),
 
-    if isinstance(obj, (bytes, bytearray)):
-        return obj.hex()
+    # text
+    ("message", "message", "text"),
+    ("raw_text", "raw_text", "text"),
+
+    # author
+    ("from_id", "from_id", "json"),
+    ("sender", "sender", "shared"),
+
+    # threading
+    ("reply_to_msg_id", "reply_to_msg_id", "raw"),
 
-    if isinstance(obj, dt.datetime):
-        return obj.isoformat()
+    # formatting / content
+    ("entities", "entities", "json"),
+    ("media", "media", "json"),
+    ("reactions", "reactions", "json"),
+)
 
-    if isinstance(obj, dict):
-        return {k: obj_to_dict_safe(v) for k, v in obj.items()}
+FIELDNAMES: tuple[str, ...] = tuple(name for name, _, _ in COLUMNS)
 
-    if isinstance(obj, (list, tuple, set)):
-        return [obj_to_dict_safe(x) for x in obj]
 
-    if hasattr(obj, "to_dict"):
-        try:
-            raw = obj.to_dict()
-        except Exception:
-            return repr(obj)
-        return obj_to_dict_safe(raw)
+# class -> its to_dict function (None if it has none), filled on first use
+TO_DICT: Dict[type, Callable[[Any], dict] | None] = {}
 
+
+def json_default(obj: Any) -> Any:
+    """
+    Fallback for objects orjson can't serialize natively (TL objects, bytes).
+    """
+    cls = type(obj)
+    try:
+        to_dict = TO_DICT[cls]
+    except KeyError:
+        to_dict = TO_DICT[cls] = getattr(cls, "to_dict", None)
+    if to_dict is not None:
+        return to_dict(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.hex()
     return repr(obj)
 
 
-def message_to_record(msg: Message) -> Dict[str, Any]:
+def build_extractor(
+    columns: tuple, as_record: bool = False
+) -> Callable[[Message, dict | None], Any]:
     """
-    Extract rich metadata for a single comment.
+    Generate extract_row(msg, cache) for the given column spec, returning
+    the CSV row of a comment in column order with every conversion
+    inlined; "shared" cells are memoized in cache by object id.
+
+    With as_record=True the function returns a {column: value} dict of
+    native values for JSONL, encoded later by a single orjson.dumps call.
+    Records memoize nothing, so their cache argument may be None.
     """
-    return {
-        # basic
-        "id": msg.id,
-        "date": dt_to_iso(msg.date),
-        "date_ts": int(msg.date.timestamp()) if msg.date else None,
-
-        # text
-        "message": msg.message,
-        "raw_text": msg.raw_text,
-
-        # author
-        "from_id": obj_to_dict_safe(getattr(msg, "from_id", None)),
-        "sender": obj_to_dict_safe(getattr(msg, "sender", None)),
-
-        # threading
-        "reply_to_msg_id": getattr(msg, "reply_to_msg_id", None),
-
-        # formatting / content
-        "entities": obj_to_dict_safe(getattr(msg, "entities", None)),
-        "media": obj_to_dict_safe(getattr(msg, "media", None)),
-        "reactions": obj_to_dict_safe(getattr(msg, "reactions", None)),
+    lines = ["def extract_row(msg, cache):"]
+    items = []
+    local_names: Dict[str, str] = {}
+
+    for _, attr, kind in columns:
+        load = f"msg.{attr}"
+
+        # records keep native values; only date_ts is derived
+        if kind == "raw" or (as_record and kind != "ts"):
+            items.append(load)
+            continue
+
+        # each attribute is loaded once, e.g. date feeds both date and date_ts
+        v = local_names.get(attr)
+        if v is None:
+            v = local_names[attr] = f"v{len(local_names)}"
+            lines.append(f"    {v} = {load}")
+        if kind == "text":
+            # str.replace is deliberate: str.translate with multi-char
+            # replacements is a per-character slow path
+            expr = f"{v}.replace('\\r', '\\\\r').replace('\\n', '\\\\n') if {v} else {v}"
+        elif kind == "json":
+            expr = (
+                f"None if {v} is None else "
+                f"dumps({v}, default=json_default, option=JSON_OPTIONS).decode()"
+            )
+        elif kind == "shared":
+            # cache holds (obj, cell): keeping obj alive pins its id()
+            c = f"c{len(local_names)}"
+            lines += [
+                f"    if {v} is None:",
+                f"        {c} = None",
+                "    else:",
+                f"        hit = cache.get(id({v}))",
+                "        if hit is None:",
+                f"            hit = cache[id({v})] = ({v}, dumps(",
+                f"                {v}, default=json_default, option=JSON_OPTIONS",
+                "            ).decode())",
+                f"        {c} = hit[1]",
+            ]
+            expr = c
+        elif kind == "iso":
+            expr = f"{v}.isoformat() if {v} else None"
+        elif kind == "ts":
+            expr = f"int({v}.timestamp()) if {v} else None"
+        else:
+            raise ValueError(f"Unknown column kind: {kind}")
+        items.append(f"({expr})")
+
+    if as_record:
+        lines.append("    return {")
+        lines.extend(
+            f"        {name!r}: {item}," for (name, _, _), item in zip(columns, items)
+        )
+        lines.append("    }")
+    else:
+        lines.append("    return [")
+        lines.extend(f"        {item}," for item in items)
+        lines.append("    ]")
+
+    # encoder and its settings are bound once as globals of the generated code
+    namespace: Dict[str, Any] = {
+        "dumps": orjson.dumps,
+        "json_default": json_default,
+        "JSON_OPTIONS": JSON_OPTIONS,
     }
+    exec("\n".join(lines), namespace)
+    return namespace["extract_row"]
+
+
+extract_row = build_extractor(COLUMNS)
+extract_record = build_extractor(COLUMNS, as_record=True)
+
+
+def open_output(path: str, mode: str) -> IO[bytes]:
+    """
+    Open the binary output file, gzip-compressed when COMPRESS_OUTPUT is set.
+    """
+    if COMPRESS_OUTPUT:
+        # level 1: several times smaller for text-heavy exports at little CPU
+        return gzip.open(path, mode, compresslevel=1)
+    return open(path, mode, buffering=WRITE_BUFFER_SIZE)
+
+
+def flush_rows(buf: io.StringIO | io.BytesIO, out: IO[bytes]) -> None:
+    """
+    Move the rows accumulated in buf to the output file in one write,
+    encoding CSV text once per batch.
+    """
+    chunk = buf.getvalue()
+    out.write(chunk.encode() if isinstance(chunk, str) else chunk)
+    buf.seek(0)
+    buf.truncate()
 
 
 async def fetch_post_comments() -> None:
@@ -109,48 +223,55 @@ async def fetch_post_comments() -> None:
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     output_path = os.path.join(
         OUTPUT_DIR,
-        f"{CHANNEL_PEER_ID}_{MESSAGE_ID}_comments.csv",
+        f"{CHANNEL_PEER_ID}_{MESSAGE_ID}_comments.{OUTPUT_FORMAT}",
     )
+    if COMPRESS_OUTPUT:
+        output_path += ".gz"
 
     print(f"[+] Output: {output_path}")
 
-    csv_file = open(output_path, "w", encoding="utf-8", newline="")
-    writer = None
+    jsonl = OUTPUT_FORMAT == "jsonl"
+    # rows are formatted into buf and written to the file in batches,
+    # as raw bytes
+    out_file = open_output(output_path, "wb")
+    if jsonl:
+        buf = io.BytesIO()
+    else:
+        buf = io.StringIO(newline="")
+        writer = csv.writer(buf, quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(FIELDNAMES)
+    # commenters repeat within a batch: serialize each sender once
+    sender_cache: Dict[int, tuple] = {}
     total = 0
 
     try:
         # Core idea: let Telethon resolve discussion chat internally
+        # no limit: without wait_time=0 Telethon sleeps 1s between requests
         async for msg in client.iter_messages(
             channel,
+            limit=None,
             reply_to=MESSAGE_ID,
+            wait_time=0,
         ):
-            if not isinstance(msg, Message):
+            if type(msg) is not Message:  # skips MessageService / MessageEmpty
                 continue
 
-            rec = message_to_record(msg)
-
-            if writer is None:
-                fieldnames = list(rec.keys())
-                writer = csv.DictWriter(
-                    csv_file,
-                    fieldnames=fieldnames,
-                    quoting=csv.QUOTE_MINIMAL,
+            if jsonl:
+                buf.write(
+                    orjson.dumps(
+                        extract_record(msg, None),
+                        default=json_default,
+                        option=JSONL_OPTIONS,
+                    )
                 )
-                writer.writeheader()
-
-            row: Dict[str, Any] = {}
-            for k, v in rec.items():
-                if isinstance(v, (dict, list)):
-                    row[k] = json.dumps(v, ensure_ascii=False)
-                elif isinstance(v, str):
-                    # keep CSV one physical row per message
-                    row[k] = v.replace("\r", "\\r").replace("\n", "\\n")
-                else:
-                    row[k] = v
-
-            writer.writerow(row)
+            else:
+                writer.writerow(extract_row(msg, sender_cache))
             total += 1
 
+            if total % WRITE_BATCH == 0:
+                flush_rows(buf, out_file)
+                sender_cache.clear()
+
             if total % 20 == 0:
                 print(f"[+] Collected comments: {total}")
 
@@ -159,9 +280,13 @@ async def fetch_post_comments() -> None:
     except errors.FloodWaitError as e:
         print(f"[!] FloodWait: wait {e.seconds} seconds and rerun.")
     finally:
-        csv_file.close()
+        flush_rows(buf, out_file)
+        out_file.close()
         await client.disconnect()
 
 
 if __name__ == "__main__":
-    asyncio.run(fetch_post_comments())
+    if uvloop is not None:
+        uvloop.run(fetch_post_comments())
+    else:
+        asyncio.run(fetch_post_comments())